@@ -3,30 +3,46 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-def gerar_dados():
-    # (Conteúdo idêntico à função gerar_dados() do código acima)
+# Gerador reaproveitado entre chamadas (API Generator, sem o RandomState global)
+_RNG = np.random.default_rng()
+
+def gerar_dados(seed=None, hoje=None):
     num_rotas = 100
     viagens_por_rota = 5
-    start_date = datetime.now().date() - timedelta(days=20)
-    end_date = datetime.now().date() + timedelta(days=20)
-    date_range = pd.date_range(start=start_date, end=end_date, freq="D")
-    
-    dados = []
-    for rota in [f"R{i+1}" for i in range(num_rotas)]:
-        datas_rota = np.random.choice(date_range, size=viagens_por_rota, replace=False)
-        for data in datas_rota:
-            gmv_base = np.random.randint(500, 2000)
-            cash_base = np.random.randint(-500, 1000)
-            gmv_real = gmv_base + np.random.randint(-100, 100)
-            cash_real = cash_base + np.random.randint(-50, 50)
-            dados.append({
-                "Data": data,
-                "Rota": rota,
-                "GMV_baseline": gmv_base,
-                "GMV_realizado": gmv_real,
-                "Cash_baseline": cash_base,
-                "Cash_realizado": cash_real
-            })
-    df = pd.DataFrame(dados)
-    df["Data"] = pd.to_datetime(df["Data"])
+    # O dia de referência pode vir de quem chama (e entrar na chave de cache dele)
+    if hoje is None:
+        hoje = datetime.now().date()
+    start_date = hoje - timedelta(days=20)
+    end_date = hoje + timedelta(days=20)
+    # Materializa as datas uma única vez como ndarray datetime64[ns]
+    datas = pd.date_range(start=start_date, end=end_date, freq="D", unit="ns").to_numpy()
+
+    rotas = [f"R{i+1}" for i in range(num_rotas)]
+
+    rng = _RNG if seed is None else np.random.default_rng(seed)
+    n = num_rotas * viagens_por_rota
+
+    # Sorteia `viagens_por_rota` datas distintas por rota de uma só vez:
+    # os menores índices de uma matriz aleatória equivalem a uma amostra sem reposição.
+    idx_datas = np.argpartition(
+        rng.random((num_rotas, len(datas))), viagens_por_rota, axis=1
+    )[:, :viagens_por_rota]
+
+    # int16 basta para os valores por viagem (no máximo 2098 em módulo);
+    # as somas por data voltam em int64
+    gmv_base = rng.integers(500, 2000, size=n, dtype=np.int16)
+    cash_base = rng.integers(-500, 1000, size=n, dtype=np.int16)
+    gmv_real = gmv_base + rng.integers(-100, 100, size=n, dtype=np.int16)
+    cash_real = cash_base + rng.integers(-50, 50, size=n, dtype=np.int16)
+
+    # Arrays já tipados: o DataFrame aproveita os buffers sem copiá-los
+    df = pd.DataFrame({
+        "Data": datas[idx_datas.ravel()],
+        # Categórica: códigos inteiros no lugar de strings repetidas a cada viagem
+        "Rota": pd.Categorical.from_codes(np.repeat(np.arange(num_rotas), viagens_por_rota), rotas),
+        "GMV_baseline": gmv_base,
+        "GMV_realizado": gmv_real,
+        "Cash_baseline": cash_base,
+        "Cash_realizado": cash_real
+    }, copy=False)
     return df
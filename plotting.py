@@ -1,83 +1,211 @@
 ## plotting.py
 
+from collections import namedtuple
+from functools import lru_cache
+
 import plotly.graph_objects as go
+import plotly.io as pio
 import pandas as pd
+import numpy as np
 
-def plot_gmv_acumulado(
-    df_base_acum,    # DF acumulado do cenário base (Realizado/Previsto)
-    df_sim_acum,     # DF acumulado do cenário simulado (cancelamentos)
-    df_diff,         # Diferença acumulada entre simulação e base
-    df_baseline_meta,# DF com baseline histórico acumulado e meta histórica diluída acumulada
-    check_start,     # Início do período do check (hoje + 48h)
-    check_end,       # Fim do período do check (hoje + 72h)
-    hoje_dt,         # Dia de hoje (Timestamp)
-    rotas_canceladas = []  # Lista de rotas canceladas (pode estar vazia)
-):
+# Serializa as figuras com orjson (codifica os arrays NumPy direto, em C);
+# sem ele instalado, fica o encoder padrão do Plotly
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = "orjson"
+except ImportError:
+    pass
+
+# Acima deste número de pontos o hover do baseline histórico é desligado
+LIMITE_HOVER_PONTOS = 20000
+# Largura (em pixels) usada para reduzir as séries via M4 antes de plotar
+LARGURA_PX = 1200
+# Casas decimais do hover; as séries só vão em float32 se o texto arredondado não muda
+CASAS_HOVER = 2
+
+
+def _m4_downsample(x, y, width_px=LARGURA_PX):
     """
-    Cria o gráfico de GMV Acumulado com as seguintes regras:
-      - Linha azul sólida até hoje (Realizado);
-      - Linha azul tracejada de hoje em diante (Previsto);
-      - A partir de check_start, a linha de Simulação (vermelha) inicia,
-        alinhada ao acumulado base no check_start; se não houver cancelamento,
-        ela coincide com a linha azul.
-      - Exibe Baseline Histórico (linha cinza) e Meta Histórica Diluída (linha verde);
-      - Adiciona uma faixa cinza para o período do check de cancelamento e uma linha vertical em "Hoje".
-    Os nomes dos traces seguem o padrão utilizado na função para Cash:
-      "Baseline Histórico", "Meta Ajustada", "Realizado", "Previsto",
-      "Simulação - Check de cancelamento" e "Diferença Acumulada".
+    Reduz a série (x, y), ordenada em x, mantendo por coluna de pixel apenas
+    o primeiro, o último, o mínimo e o máximo (agregação M4). O traçado
+    resultante é visualmente idêntico ao original com no máximo 4·width_px pontos.
     """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= 4 * width_px:
+        return x, y
 
-    fig = go.Figure()
-    fig.update_xaxes(type="date")
-
-    # Faixa cinza: Período do check de cancelamento [check_start, check_end]
-    fig.add_shape(
-        type="rect",
-        x0=check_start.isoformat(),
-        x1=check_end.isoformat(),
-        y0=0, y1=1,
-        xref="x", yref="paper",
-        fillcolor="gray",
-        opacity=0.2,
-        layer="below",
-        line_width=0
-    )
-    fig.add_annotation(
-        x=(check_start + (check_end - check_start)/2).isoformat(),
-        y=1.07,
-        xref="x",
-        yref="paper",
-        showarrow=False,
-        text="Período do check de cancelamento",
-        font=dict(color="gray", size=12)
+    xi = x.astype("int64")
+    span = xi[-1] - xi[0]
+    if span == 0:
+        return x, y
+    bucket = np.minimum((xi - xi[0]) * width_px // span, width_px - 1)
+
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.append(starts[1:], len(x)) - 1
+    # Ordena por (bucket, y): o primeiro/último de cada bucket são o mínimo/máximo
+    order = np.lexsort((y, bucket))
+    idx = np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+    return x[idx], y[idx]
+
+
+def _float32(y):
+    """
+    Converte séries float64 para float32 (metade dos bytes no JSON) quando a perda de
+    precisão não aparece no hover; inteiros o Plotly já envia no menor tipo possível.
+    """
+    if y.dtype != np.float64:
+        return y
+    y32 = y.astype(np.float32)
+    # O hover precisa mostrar o mesmo texto nos dois tipos (arredondamento correto, como
+    # o d3-format): uma tolerância absoluta ou o np.round (meio-par sobre o valor escalado)
+    # não bastam, p.ex. 1234.565 mostra 1234.57 em float64 e 1234.56 em float32.
+    # Compara os centavos arredondados; em float32, y32 * 10**casas é exato
+    escala = 10**CASAS_HOVER
+    y_esc = y * escala
+    y32_esc = y32.astype(np.float64) * escala
+    # NaN/inf não têm centavos: as comparações com eles dão False, sem aviso
+    with np.errstate(invalid="ignore"):
+        # Meio centavo exato em float32: o navegador desempata para cima, o printf para o par
+        if (np.abs(y32_esc % 1) == 0.5).any():
+            return y
+        if (np.floor(y_esc + 0.5) != np.floor(y32_esc + 0.5))[~np.isnan(y)].any():
+            return y
+        # Perto do meio centavo o escalonamento em float64 pode errar o lado: só esses
+        # valores são formatados como texto para confirmar
+        perto = np.abs(np.abs(y_esc % 1) - 0.5) < 1e-6
+    if perto.any():
+        formato = f"%.{CASAS_HOVER}f"
+        if not np.array_equal(
+            np.char.mod(formato, y[perto]), np.char.mod(formato, y32[perto].astype(np.float64))
+        ):
+            return y
+    return y32
+
+
+def _linha(x, y, name, **kwargs):
+    """
+    Monta um trace scattergl como dict simples (o go.Figure os recebe direto, sem
+    instanciar um go.Scattergl por trace), já com a série reduzida via M4, em float32
+    quando possível, e o hovertemplate.
+    """
+    x, y = _m4_downsample(x, y)
+    y = _float32(y)
+    return dict(
+        type="scattergl",
+        x=x, y=y, name=name,
+        legendgroup=name,
+        hovertemplate=f"{name}: %{{y:.{CASAS_HOVER}f}}<extra></extra>",
+        **kwargs
     )
 
-    # Linha vertical em "Hoje"
-    fig.add_vline(
-        x=hoje_dt,
-        line=dict(color="black", dash="dash")
+
+@lru_cache(maxsize=8)
+def _marcacoes(check_start, check_end, hoje_dt, eixos_y=("y",)):
+    """
+    Monta as shapes (faixa cinza do período do check de cancelamento e linha vertical
+    em "Hoje", repetidas para cada eixo y em `eixos_y`) e as anotações correspondentes,
+    prontas para entrar direto no layout da figura.
+
+    Resultado em cache: GMV e Cash (e reruns com a mesma janela) reaproveitam as mesmas
+    marcações; o go.Figure copia o layout recebido, então as tuplas não são alteradas.
+    """
+    inicio_iso, fim_iso = check_start.isoformat(), check_end.isoformat()
+    meio_iso = (check_start + (check_end - check_start)/2).isoformat()
+    shapes = []
+    for eixo_y in eixos_y:
+        eixo_x = eixo_y.replace("y", "x")
+        # Faixa cinza: Período do check de cancelamento [check_start, check_end]
+        shapes.append(dict(
+            type="rect",
+            x0=inicio_iso,
+            x1=fim_iso,
+            y0=0, y1=1,
+            xref=eixo_x, yref=f"{eixo_y} domain",
+            fillcolor="gray",
+            opacity=0.2,
+            layer="below",
+            line=dict(width=0)
+        ))
+        # Linha vertical em "Hoje"
+        shapes.append(dict(
+            type="line",
+            x0=hoje_dt, x1=hoje_dt,
+            y0=0, y1=1,
+            xref=eixo_x, yref=f"{eixo_y} domain",
+            line=dict(color="black", dash="dash")
+        ))
+
+    annotations = (
+        dict(
+            x=meio_iso,
+            y=1.07,
+            xref="x",
+            yref="paper",
+            showarrow=False,
+            text="Período do check de cancelamento",
+            font=dict(color="gray", size=12)
+        ),
+        dict(
+            x=hoje_dt,
+            y=1.03,
+            xref="x", yref="paper",
+            showarrow=False,
+            text="Hoje",
+            font=dict(color="black", size=12)
+        ),
     )
-    fig.add_annotation(
-        x=hoje_dt,
-        y=1.03,
-        xref="x", yref="paper",
-        showarrow=False,
-        text="Hoje",
-        font=dict(color="black", size=12)
+    return tuple(shapes), annotations
+
+
+# Cortes por data que independem da métrica: calculados uma vez e usados por GMV e Cash
+ContextoPlot = namedtuple("ContextoPlot", "i_hoje i_check i_sim i_diff sim_datas diff_datas")
+
+
+def preparar_contexto(df_base_acum, df_sim_acum, df_diff, hoje_dt, check_start):
+    """
+    Calcula, para DataFrames ordenados por Data, as posições de corte em "Hoje" e em
+    check_start (via busca binária) e as datas da simulação/diferença a partir do check.
+    """
+    check_np = np.datetime64(check_start, "ns")
+    i_hoje, i_check = np.searchsorted(
+        df_base_acum["Data"].to_numpy(), [np.datetime64(hoje_dt, "ns"), check_np]
     )
+    sim_datas = df_sim_acum["Data"].to_numpy()
+    diff_datas = df_diff["Data"].to_numpy()
+    i_sim = np.searchsorted(sim_datas, check_np)
+    i_diff = np.searchsorted(diff_datas, check_np)
+    return ContextoPlot(i_hoje, i_check, i_sim, i_diff, sim_datas[i_sim:], diff_datas[i_diff:])
+
+
+def _traces_acumulado(
+    df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+    contexto, rotas_canceladas,
+    *, value_col, baseline_col, meta_col, diff_col
+):
+    """
+    Monta os traces de uma métrica acumulada (GMV ou Cash) a partir dos nomes de coluna:
+    value_col (ex.: "GMV_acumulado"), baseline_col ("GMV_baseline_acumulado"),
+    meta_col ("GMV_meta_acumulada") e diff_col ("GMV_diferenca").
+    """
+    traces = []
+    i_hoje, i_check, i_sim, i_diff, sim_datas, diff_datas = contexto
 
-    # Baseline Histórico Acumulado (GMV) e Meta Histórica Diluída Acumulada
-    fig.add_trace(go.Scatter(
-        x=df_baseline_meta["Data"],
-        y=df_baseline_meta["GMV_baseline_acumulado"],
+    # Baseline Histórico Acumulado e Meta Histórica Diluída Acumulada
+    # Arrays NumPy direto para o Plotly, sem o invólucro da Series
+    meta_datas = df_baseline_meta["Data"].to_numpy()
+    traces.append(_linha(
+        meta_datas,
+        df_baseline_meta[baseline_col].to_numpy(),
         mode="lines",
         name="Baseline Histórico",
         line=dict(color="gray", dash="dash"),
-        opacity=0.7
+        opacity=0.7,
+        hoverinfo="skip" if len(df_baseline_meta) > LIMITE_HOVER_PONTOS else None
     ))
-    fig.add_trace(go.Scatter(
-        x=df_baseline_meta["Data"],
-        y=df_baseline_meta["GMV_meta_acumulada"],
+    traces.append(_linha(
+        meta_datas,
+        df_baseline_meta[meta_col].to_numpy(),
         mode="lines",
         name="Meta Ajustada",
         line=dict(color="green", dash="dot"),
@@ -86,19 +214,20 @@ def plot_gmv_acumulado(
 
     # Linha Azul - Realizado/Previsto Acumulado
     # Dividimos em duas partes: "Realizado" (passado) e "Previsto" (futuro)
-    df_base_past = df_base_acum[df_base_acum["Data"] < hoje_dt]
-    df_base_future = df_base_acum[df_base_acum["Data"] >= hoje_dt]
+    # Só as duas colunas plotadas, como arrays
+    base_datas = df_base_acum["Data"].to_numpy()
+    base_valores = df_base_acum[value_col].to_numpy()
 
-    fig.add_trace(go.Scatter(
-        x=df_base_past["Data"],
-        y=df_base_past["GMV_acumulado"],
+    traces.append(_linha(
+        base_datas[:i_hoje],
+        base_valores[:i_hoje],
         mode="lines",
         name="Realizado",
         line=dict(color="#00008B", width=3, dash="solid")
     ))
-    fig.add_trace(go.Scatter(
-        x=df_base_future["Data"],
-        y=df_base_future["GMV_acumulado"],
+    traces.append(_linha(
+        base_datas[i_hoje:],
+        base_valores[i_hoje:],
         mode="lines",
         name="Previsto",
         line=dict(color="#00008B", width=3, dash="dash")
@@ -106,72 +235,126 @@ def plot_gmv_acumulado(
 
     # Linha Vermelha (Simulação): deve começar a partir de check_start,
     # alinhando seu primeiro ponto ao valor acumulado do base no momento de check_start.
-    df_base_before_check = df_base_acum[df_base_acum["Data"] < check_start]
-    if not df_base_before_check.empty:
-        base_cutoff_gmv = df_base_before_check["GMV_acumulado"].max()
-    else:
-        base_cutoff_gmv = 0
+    base_cutoff = base_valores[i_check - 1] if i_check > 0 else 0
 
-    # Filtra a simulação somente para datas >= check_start
-    df_sim_check = df_sim_acum[df_sim_acum["Data"] >= check_start].copy()
+    # Simulação somente para datas >= check_start, direto em arrays (sem copiar o DataFrame)
+    sim_valores = df_sim_acum[value_col].to_numpy()[i_sim:]
 
-    if len(rotas_canceladas) == 0:
+    if len(rotas_canceladas) == 0 or len(sim_valores) == 0:
         # Sem cancelamento: a linha de simulação coincide com a linha azul prevista
-        if not df_sim_check.empty:
-            df_sim_check["GMV_acumulado_alinhado"] = df_sim_check["GMV_acumulado"]
-        else:
-            df_sim_check["GMV_acumulado_alinhado"] = df_sim_check["GMV_acumulado"]
+        sim_alinhado = sim_valores
     else:
         # Com cancelamento: realinha para iniciar no base_cutoff
-        if not df_sim_check.empty:
-            primeiro_valor_sim = df_sim_check.iloc[0]["GMV_acumulado"]
-            df_sim_check["GMV_acumulado_alinhado"] = base_cutoff_gmv + (df_sim_check["GMV_acumulado"] - primeiro_valor_sim)
-        else:
-            df_sim_check["GMV_acumulado_alinhado"] = df_sim_check["GMV_acumulado"]
+        sim_alinhado = base_cutoff + (sim_valores - sim_valores[0])
 
-    fig.add_trace(go.Scatter(
-        x=df_sim_check["Data"],
-        y=df_sim_check["GMV_acumulado_alinhado"],
+    traces.append(_linha(
+        sim_datas,
+        sim_alinhado,
         mode="lines",
         name="Simulação - Check de cancelamento",
         line=dict(color="red", width=3)
     ))
 
     # Linha de Diferença Acumulada: a partir de check_start
-    df_diff_check = df_diff[df_diff["Data"] >= check_start].copy()
-    if not df_diff_check.empty and not df_sim_check.empty:
-        df_diff_check = df_diff_check.merge(
-            df_sim_check[["Data", "GMV_acumulado_alinhado"]],
-            on="Data",
-            how="left"
-        )
-        df_diff_check["GMV_diferenca_alinhada"] = df_diff_check["GMV_acumulado_alinhado"] - df_diff_check["GMV_acumulado"]
+    if len(diff_datas) and len(sim_datas):
+        if np.array_equal(sim_datas, diff_datas):
+            # Mesmas datas na mesma ordem: subtração posicional direta
+            alinhado = sim_alinhado
+        else:
+            # Alinha por busca binária nas datas ordenadas (datas ausentes viram NaN, como no merge à esquerda)
+            pos = np.minimum(np.searchsorted(sim_datas, diff_datas), len(sim_datas) - 1)
+            alinhado = np.where(sim_datas[pos] == diff_datas, sim_alinhado[pos], np.nan)
+        diff_alinhada = alinhado - df_diff[value_col].to_numpy()[i_diff:]
     else:
-        df_diff_check["GMV_diferenca_alinhada"] = df_diff_check["GMV_diferenca"]
+        diff_alinhada = df_diff[diff_col].to_numpy()[i_diff:]
 
-    fig.add_trace(go.Scatter(
-        x=df_diff_check["Data"],
-        y=df_diff_check["GMV_diferenca_alinhada"],
+    traces.append(_linha(
+        diff_datas,
+        diff_alinhada,
         mode="lines",
         name="Diferença Acumulada",
         line=dict(color="red", width=2, dash="dot")
     ))
+    return traces
+
 
-    fig.update_layout(
-        title="GMV Acumulado - Base vs. Simulação",
-        xaxis_title="Data",
-        yaxis_title="GMV Acumulado",
-        hovermode="x unified"
+def _colunas(metrica):
+    """Nomes das colunas acumuladas de uma métrica ("GMV" ou "Cash")."""
+    return dict(
+        value_col=f"{metrica}_acumulado",
+        baseline_col=f"{metrica}_baseline_acumulado",
+        meta_col=f"{metrica}_meta_acumulada",
+        diff_col=f"{metrica}_diferenca"
     )
-    for trace in fig.data:
-        trace.hovertemplate = f"{trace.name}: "+"%{y:.2f}"+"<extra></extra>"
 
-    return fig
+
+def _plot_acumulado(
+    metrica, df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+    check_start, check_end, hoje_dt, rotas_canceladas, hovermode, contexto
+):
+    """Implementação comum de plot_gmv_acumulado e plot_cash_acumulado."""
+    if contexto is None:
+        contexto = preparar_contexto(df_base_acum, df_sim_acum, df_diff, hoje_dt, check_start)
+
+    traces = _traces_acumulado(
+        df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+        contexto, rotas_canceladas, **_colunas(metrica)
+    )
+    shapes, annotations = _marcacoes(check_start, check_end, hoje_dt)
+
+    # Traces, shapes e anotações entram de uma vez no construtor da figura. Tudo é
+    # montado aqui com propriedades fixas e conhecidas, então a validação do Plotly é pulada
+    return go.Figure(
+        _validate=False,
+        data=traces,
+        layout=dict(
+            title=dict(text=f"{metrica} Acumulado - Base vs. Simulação"),
+            xaxis=dict(type="date", title=dict(text="Data")),
+            yaxis=dict(title=dict(text=f"{metrica} Acumulado")),
+            hovermode=hovermode,
+            # Mantém zoom/pan do navegador entre reruns (a figura é reenviada a cada seleção)
+            uirevision=metrica,
+            shapes=shapes,
+            annotations=annotations
+        )
+    )
+
+
+def plot_gmv_acumulado(
+    df_base_acum,    # DF acumulado do cenário base (Realizado/Previsto)
+    df_sim_acum,     # DF acumulado do cenário simulado (cancelamentos)
+    df_diff,         # Diferença acumulada entre simulação e base
+    df_baseline_meta,# DF com baseline histórico acumulado e meta histórica diluída acumulada
+    check_start,     # Início do período do check (hoje + 48h)
+    check_end,       # Fim do período do check (hoje + 72h)
+    hoje_dt,         # Dia de hoje (Timestamp)
+    rotas_canceladas = (),  # Rotas canceladas (pode estar vazia)
+    hovermode = "x",        # Modo de hover do Plotly ("x unified" é O(N·T) por movimento do mouse)
+    contexto = None         # ContextoPlot de preparar_contexto (calculado aqui se ausente)
+):
+    """
+    Cria o gráfico de GMV Acumulado com as seguintes regras:
+      - Linha azul sólida até hoje (Realizado);
+      - Linha azul tracejada de hoje em diante (Previsto);
+      - A partir de check_start, a linha de Simulação (vermelha) inicia,
+        alinhada ao acumulado base no check_start; se não houver cancelamento,
+        ela coincide com a linha azul.
+      - Exibe Baseline Histórico (linha cinza) e Meta Histórica Diluída (linha verde);
+      - Adiciona uma faixa cinza para o período do check de cancelamento e uma linha vertical em "Hoje".
+    Os nomes dos traces seguem o padrão utilizado na função para Cash:
+      "Baseline Histórico", "Meta Ajustada", "Realizado", "Previsto",
+      "Simulação - Check de cancelamento" e "Diferença Acumulada".
+    """
+    return _plot_acumulado(
+        "GMV", df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+        check_start, check_end, hoje_dt, rotas_canceladas, hovermode, contexto
+    )
 
 
 def plot_cash_acumulado(
     df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
-    check_start, check_end, hoje_dt, rotas_canceladas = []
+    check_start, check_end, hoje_dt, rotas_canceladas = (), hovermode = "x",
+    contexto = None
 ):
     """
     Cria o gráfico de Cash Acumulado com a mesma lógica de GMV:
@@ -183,129 +366,60 @@ def plot_cash_acumulado(
       "Baseline Histórico", "Meta Ajustada", "Realizado", "Previsto",
       "Simulação - Check de cancelamento" e "Diferença Acumulada".
     """
-    fig = go.Figure()
-    fig.update_xaxes(type="date")
-
-    fig.add_shape(
-        type="rect",
-        x0=check_start.isoformat(),
-        x1=check_end.isoformat(),
-        y0=0, y1=1,
-        xref="x", yref="paper",
-        fillcolor="gray",
-        opacity=0.2,
-        layer="below",
-        line_width=0
-    )
-    fig.add_annotation(
-        x=(check_start + (check_end - check_start)/2).isoformat(),
-        y=1.07,
-        xref="x", yref="paper",
-        showarrow=False,
-        text="Período do check de cancelamento",
-        font=dict(color="gray", size=12)
-    )
-
-    fig.add_vline(
-        x=hoje_dt,
-        line=dict(color="black", dash="dash")
-    )
-    fig.add_annotation(
-        x=hoje_dt,
-        y=1.03,
-        xref="x", yref="paper",
-        showarrow=False,
-        text="Hoje",
-        font=dict(color="black", size=12)
+    return _plot_acumulado(
+        "Cash", df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+        check_start, check_end, hoje_dt, rotas_canceladas, hovermode, contexto
     )
 
-    fig.add_trace(go.Scatter(
-        x=df_baseline_meta["Data"],
-        y=df_baseline_meta["Cash_baseline_acumulado"],
-        mode="lines",
-        name="Baseline Histórico",
-        line=dict(color="gray", dash="dash"),
-        opacity=0.7
-    ))
-    fig.add_trace(go.Scatter(
-        x=df_baseline_meta["Data"],
-        y=df_baseline_meta["Cash_meta_acumulada"],
-        mode="lines",
-        name="Meta Ajustada",
-        line=dict(color="green", dash="dot"),
-        opacity=0.7
-    ))
-
-    df_base_past = df_base_acum[df_base_acum["Data"] < hoje_dt]
-    df_base_future = df_base_acum[df_base_acum["Data"] >= hoje_dt]
-    fig.add_trace(go.Scatter(
-        x=df_base_past["Data"],
-        y=df_base_past["Cash_acumulado"],
-        mode="lines",
-        name="Realizado",
-        line=dict(color="#00008B", width=3, dash="solid")
-    ))
-    fig.add_trace(go.Scatter(
-        x=df_base_future["Data"],
-        y=df_base_future["Cash_acumulado"],
-        mode="lines",
-        name="Previsto",
-        line=dict(color="#00008B", width=3, dash="dash")
-    ))
-
-    df_base_before_check = df_base_acum[df_base_acum["Data"] < check_start]
-    if not df_base_before_check.empty:
-        base_cutoff_cash = df_base_before_check["Cash_acumulado"].max()
-    else:
-        base_cutoff_cash = 0
-
-    df_sim_check = df_sim_acum[df_sim_acum["Data"] >= check_start].copy()
-
-    if len(rotas_canceladas) == 0:
-        if not df_sim_check.empty:
-            df_sim_check["Cash_acumulado_alinhado"] = df_sim_check["Cash_acumulado"]
-        else:
-            df_sim_check["Cash_acumulado_alinhado"] = df_sim_check["Cash_acumulado"]
-    else:
-        if not df_sim_check.empty:
-            primeiro_valor_sim = df_sim_check.iloc[0]["Cash_acumulado"]
-            df_sim_check["Cash_acumulado_alinhado"] = base_cutoff_cash + (df_sim_check["Cash_acumulado"] - primeiro_valor_sim)
-        else:
-            df_sim_check["Cash_acumulado_alinhado"] = df_sim_check["Cash_acumulado"]
 
-    fig.add_trace(go.Scatter(
-        x=df_sim_check["Data"],
-        y=df_sim_check["Cash_acumulado_alinhado"],
-        mode="lines",
-        name="Simulação - Check de cancelamento",
-        line=dict(color="red", width=3)
-    ))
+def plot_gmv_cash_combined(
+    df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+    check_start, check_end, hoje_dt, rotas_canceladas = (), hovermode = "x",
+    contexto = None
+):
+    """
+    Cria uma única figura com GMV (em cima) e Cash (embaixo) acumulados, compartilhando
+    o eixo x. Os traces são os mesmos de plot_gmv_acumulado/plot_cash_acumulado;
+    a legenda é exibida uma única vez.
+    """
+    if contexto is None:
+        contexto = preparar_contexto(df_base_acum, df_sim_acum, df_diff, hoje_dt, check_start)
 
-    df_diff_check = df_diff[df_diff["Data"] >= check_start].copy()
-    if not df_diff_check.empty and not df_sim_check.empty:
-        df_diff_check = df_diff_check.merge(
-            df_sim_check[["Data","Cash_acumulado_alinhado"]],
-            on="Data",
-            how="left"
+    traces = _traces_acumulado(
+        df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+        contexto, rotas_canceladas, **_colunas("GMV")
+    )
+    # Painel de baixo nos eixos x2/y2; a legenda vem só do primeiro painel e os traces
+    # do segundo seguem pelo legendgroup
+    traces += [
+        dict(trace, xaxis="x2", yaxis="y2", showlegend=False)
+        for trace in _traces_acumulado(
+            df_base_acum, df_sim_acum, df_diff, df_baseline_meta,
+            contexto, rotas_canceladas, **_colunas("Cash")
         )
-        df_diff_check["Cash_diferenca_alinhada"] = df_diff_check["Cash_acumulado_alinhado"] - df_diff_check["Cash_acumulado"]
-    else:
-        df_diff_check["Cash_diferenca_alinhada"] = df_diff_check["Cash_diferenca"]
-
-    fig.add_trace(go.Scatter(
-        x=df_diff_check["Data"],
-        y=df_diff_check["Cash_diferenca_alinhada"],
-        mode="lines",
-        name="Diferença Acumulada",
-        line=dict(color="red", width=2, dash="dot")
-    ))
+    ]
+    shapes, annotations = _marcacoes(check_start, check_end, hoje_dt, eixos_y=("y", "y2"))
 
-    fig.update_layout(
-        title="Cash Acumulado - Base vs. Simulação",
-        xaxis_title="Data",
-        yaxis_title="Cash Acumulado",
-        hovermode="x unified"
+    # Mesma grade do make_subplots(rows=2, shared_xaxes=True, vertical_spacing=0.08),
+    # montada direto no layout para pular a validação do Plotly (como em _plot_acumulado)
+    return go.Figure(
+        _validate=False,
+        data=traces,
+        layout=dict(
+            title=dict(text="GMV e Cash Acumulados - Base vs. Simulação"),
+            # Dois painéis empilhados: o dobro da altura padrão de uma figura
+            height=900,
+            xaxis=dict(type="date", domain=[0.0, 1.0], anchor="y", showticklabels=False),
+            # O nome de cada painel vai no título do eixo y, longe das marcações do topo
+            yaxis=dict(domain=[0.54, 1.0], anchor="x", title=dict(text="GMV Acumulado")),
+            xaxis2=dict(
+                type="date", domain=[0.0, 1.0], anchor="y2", matches="x",
+                title=dict(text="Data")
+            ),
+            yaxis2=dict(domain=[0.0, 0.46], anchor="x2", title=dict(text="Cash Acumulado")),
+            hovermode=hovermode,
+            uirevision="GMV e Cash",
+            shapes=shapes,
+            annotations=annotations
+        )
     )
-    for trace in fig.data:
-        trace.hovertemplate = f"{trace.name}: "+"%{y:.2f}"+"<extra></extra>"
-    return fig
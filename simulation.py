@@ -4,34 +4,79 @@ import pandas as pd
 from datetime import datetime
 
 def definir_valores(df, cutoff):
-    df["GMV_valor"] = np.where(df["Data"] < cutoff, df["GMV_realizado"], df["GMV_baseline"])
-    df["Cash_valor"] = np.where(df["Data"] < cutoff, df["Cash_realizado"], df["Cash_baseline"])
+    # Máscara calculada uma vez, comparando o array datetime64 com um escalar NumPy
+    passado = df["Data"].to_numpy() < np.datetime64(cutoff, "ns")
+    df["GMV_valor"] = _realizado_ou_baseline(passado, df["GMV_realizado"].to_numpy(), df["GMV_baseline"].to_numpy())
+    df["Cash_valor"] = _realizado_ou_baseline(passado, df["Cash_realizado"].to_numpy(), df["Cash_baseline"].to_numpy())
     return df
 
+def _realizado_ou_baseline(passado, realizado, baseline):
+    # Parte de uma cópia do baseline (no tipo comum às duas colunas, como o np.where)
+    # e sobrescreve só as posições do passado com o realizado
+    valores = baseline.astype(np.result_type(realizado, baseline))
+    np.copyto(valores, realizado, where=passado)
+    return valores
+
+def _ordenar_por_data(df):
+    # Os agregados já chegam ordenados por Data; só ordena (e copia) quando não estão
+    if df["Data"].is_monotonic_increasing:
+        return df
+    return df.sort_values("Data")
+
+def somar_por_data(df, colunas):
+    # Equivale a df.groupby("Data")[colunas].sum().reset_index(), com np.add.reduceat
+    # sobre as datas ordenadas no lugar da tabela hash do groupby. Como no groupby,
+    # datas NaT ficam de fora, NaN conta como zero e inteiros somam em 64 bits
+    datas = df["Data"].to_numpy()
+    validas = np.flatnonzero(~np.isnat(datas))
+    ordem = validas[np.argsort(datas[validas], kind="stable")]
+    datas = datas[ordem]
+    if len(datas):
+        inicios = np.flatnonzero(np.r_[True, datas[1:] != datas[:-1]])
+    else:
+        inicios = np.empty(0, dtype=np.intp)
+
+    somas = {"Data": datas[inicios]}
+    for col in colunas:
+        valores = df[col].to_numpy()[ordem]
+        if valores.dtype.kind == "f":
+            valores = np.where(np.isnan(valores), 0, valores)
+            tipo = np.float64
+        else:
+            tipo = np.uint64 if valores.dtype.kind == "u" else np.int64
+        if len(inicios):
+            somas[col] = np.add.reduceat(valores, inicios, dtype=tipo)
+        else:
+            somas[col] = np.zeros(0, dtype=tipo)
+    return pd.DataFrame(somas, copy=False)
+
 def transformar_em_acumulado(df, col_gmv, col_cash):
-    df_sorted = df.sort_values("Data").copy()
-    df_sorted["GMV_acumulado"] = df_sorted[col_gmv].cumsum()
-    df_sorted["Cash_acumulado"] = df_sorted[col_cash].cumsum()
-    return df_sorted
+    df_sorted = _ordenar_por_data(df)
+    # assign devolve um novo frame sem alterar o de entrada (e sem copiar as colunas existentes)
+    return df_sorted.assign(
+        GMV_acumulado=np.cumsum(df_sorted[col_gmv].to_numpy()),
+        Cash_acumulado=np.cumsum(df_sorted[col_cash].to_numpy())
+    )
 
 def calcular_meta_diluida(df_agg, meta_gmv, meta_cash):
     total_gmv = df_agg["GMV_baseline"].sum()
+    # Pesos como arrays locais, sem virar colunas do DataFrame
     if total_gmv == 0:
         df_agg["GMV_meta_diluida"] = 0
     else:
-        df_agg["Peso_GMV"] = df_agg["GMV_baseline"] / total_gmv
-        df_agg["GMV_meta_diluida"] = meta_gmv * df_agg["Peso_GMV"]
+        peso_gmv = df_agg["GMV_baseline"].to_numpy() / total_gmv
+        df_agg["GMV_meta_diluida"] = meta_gmv * peso_gmv
 
     total_cash = df_agg["Cash_baseline"].sum()
     if total_cash == 0:
         df_agg["Cash_meta_diluida"] = 0
     else:
-        df_agg["Peso_Cash"] = df_agg["Cash_baseline"] / total_cash
-        df_agg["Cash_meta_diluida"] = meta_cash * df_agg["Peso_Cash"]
+        peso_cash = df_agg["Cash_baseline"].to_numpy() / total_cash
+        df_agg["Cash_meta_diluida"] = meta_cash * peso_cash
     
-    df_agg = df_agg.sort_values("Data").copy()
-    df_agg["GMV_meta_acumulada"] = df_agg["GMV_meta_diluida"].cumsum()
-    df_agg["Cash_meta_acumulada"] = df_agg["Cash_meta_diluida"].cumsum()
+    df_agg = _ordenar_por_data(df_agg)
+    df_agg["GMV_meta_acumulada"] = np.cumsum(df_agg["GMV_meta_diluida"].to_numpy())
+    df_agg["Cash_meta_acumulada"] = np.cumsum(df_agg["Cash_meta_diluida"].to_numpy())
     return df_agg
 
 def calcular_baseline_meta_acumulada(df):
@@ -39,21 +84,45 @@ def calcular_baseline_meta_acumulada(df):
     total_cash = df["Cash_baseline"].sum()
     meta_gmv = 600000  # Exemplo fixo ou pode ser passado como argumento
     meta_cash = 300000
+    # Meta diluída como baseline escalado por meta/total, sem materializar colunas de peso
     if total_gmv == 0:
         df["GMV_meta_diluida"] = 0
     else:
-        df["Peso_GMV"] = df["GMV_baseline"] / total_gmv
-        df["GMV_meta_diluida"] = meta_gmv * df["Peso_GMV"]
+        df["GMV_meta_diluida"] = df["GMV_baseline"].to_numpy() * (meta_gmv / total_gmv)
 
     if total_cash == 0:
         df["Cash_meta_diluida"] = 0
     else:
-        df["Peso_Cash"] = df["Cash_baseline"] / total_cash
-        df["Cash_meta_diluida"] = meta_cash * df["Peso_Cash"]
-
-    df = df.sort_values("Data").copy()
-    df["GMV_baseline_acumulado"] = df["GMV_baseline"].cumsum()
-    df["Cash_baseline_acumulado"] = df["Cash_baseline"].cumsum()
-    df["GMV_meta_acumulada"] = df["GMV_meta_diluida"].cumsum()
-    df["Cash_meta_acumulada"] = df["Cash_meta_diluida"].cumsum()
+        df["Cash_meta_diluida"] = df["Cash_baseline"].to_numpy() * (meta_cash / total_cash)
+
+    df = _ordenar_por_data(df)
+    gmv_acum = np.cumsum(df["GMV_baseline"].to_numpy())
+    cash_acum = np.cumsum(df["Cash_baseline"].to_numpy())
+    df["GMV_baseline_acumulado"] = gmv_acum
+    df["Cash_baseline_acumulado"] = cash_acum
+    # A meta diluída é o baseline escalado por meta/total: seu acumulado sai do acumulado
+    # do baseline com uma multiplicação, sem um segundo cumsum
+    if total_gmv == 0:
+        df["GMV_meta_acumulada"] = np.cumsum(df["GMV_meta_diluida"].to_numpy())
+    else:
+        df["GMV_meta_acumulada"] = gmv_acum * (meta_gmv / total_gmv)
+    if total_cash == 0:
+        df["Cash_meta_acumulada"] = np.cumsum(df["Cash_meta_diluida"].to_numpy())
+    else:
+        df["Cash_meta_acumulada"] = cash_acum * (meta_cash / total_cash)
     return df
+
+def aplicar_metas(df, meta_gmv, meta_cash):
+    # Reescala a meta diluída e seu acumulado para as metas informadas a partir das colunas
+    # de baseline já calculadas (peso = baseline / total): nenhuma soma ou cumsum é refeito
+    colunas = {}
+    for metrica, meta in (("GMV", meta_gmv), ("Cash", meta_cash)):
+        acumulado = df[f"{metrica}_baseline_acumulado"].to_numpy()
+        total = acumulado[-1] if len(acumulado) else 0
+        if total == 0:
+            # Sem baseline a meta diluída é zero, qualquer que seja a meta
+            continue
+        fator = meta / total
+        colunas[f"{metrica}_meta_diluida"] = df[f"{metrica}_baseline"].to_numpy() * fator
+        colunas[f"{metrica}_meta_acumulada"] = acumulado * fator
+    return df.assign(**colunas)
@@ -1,33 +1,81 @@
 # streamlit_app.py
+import io
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
 
 # Importa funções dos outros módulos
 from data import gerar_dados
-from simulation import definir_valores, transformar_em_acumulado, calcular_meta_diluida, calcular_baseline_meta_acumulada
-from plotting import plot_gmv_acumulado, plot_cash_acumulado
+from simulation import definir_valores, somar_por_data, transformar_em_acumulado, calcular_meta_diluida, calcular_baseline_meta_acumulada, aplicar_metas
+from plotting import plot_gmv_cash_combined, preparar_contexto
 
 # Configuração da página
 st.set_page_config(page_title="Simulação de Cancelamento de Rotas (Acumulado)", layout="wide")
 
 st.title("Simulação de Cancelamento de Rotas (Acumulado)")
 
+# Streamlit reexecuta o script inteiro a cada interação; as etapas pesadas ficam em
+# st.cache_data, com DataFrames identificados pelos bytes das colunas
+def _hash_df(d):
+    """Chave barata para o cache: colunas, formato e bytes crus das colunas numéricas/de data."""
+    dados = b"".join(
+        np.ascontiguousarray(d[c].to_numpy()).tobytes() if d[c].dtype.kind in "biufmM"
+        else pd.util.hash_pandas_object(d[c], index=False).to_numpy().tobytes()
+        for c in d.columns
+    )
+    return tuple(d.columns), d.shape, dados
+
+
+@st.cache_data(show_spinner=False, persist="disk", max_entries=8)
+def carregar_dados_exemplo(dia, seed=0):
+    # Um conjunto por dia e semente: os reruns da sessão simulam sempre sobre os mesmos dados,
+    # e a cópia em disco sobrevive a reinícios do processo. max_entries limita os arquivos
+    # em disco: dias e sementes antigos saem em vez de se acumular
+    return gerar_dados(seed=seed, hoje=dia)
+
+@st.cache_data(show_spinner=False)
+def carregar_planilha(conteudo, nome):
+    # Leitura e conversões da planilha em cache pelo conteúdo do arquivo: reruns não reprocessam
+    arquivo = io.BytesIO(conteudo)
+    if nome.endswith("csv"):
+        # Parser multithread do pyarrow (já instalado com o Streamlit); as colunas continuam NumPy
+        df = pd.read_csv(arquivo, engine="pyarrow", parse_dates=["Data"])
+    else:
+        try:
+            # Leitor em Rust do python-calamine, bem mais rápido que o openpyxl padrão
+            df = pd.read_excel(arquivo, engine="calamine", parse_dates=["Data"])
+        except (ImportError, ValueError):
+            # Sem o python-calamine (ou pandas < 2.2, que não conhece o engine): openpyxl
+            arquivo.seek(0)
+            df = pd.read_excel(arquivo, parse_dates=["Data"])
+    df["Data"] = pd.to_datetime(df["Data"], errors="coerce").astype("datetime64[ns]")
+    # Colunas inteiras no menor tipo que comporta os valores (metade ou menos dos bytes
+    # por linha); colunas float ficam em float64 para não perder centavos nas somas
+    for col in ["GMV_baseline", "GMV_realizado", "Cash_baseline", "Cash_realizado"]:
+        if df[col].dtype.kind == "i":
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    # Rota categórica (como nos dados de exemplo): groupby e filtros usam códigos inteiros
+    df["Rota"] = df["Rota"].astype("category")
+    return df
+
+# O relógio é lido uma única vez por execução: "hoje" (dia) e o instante atual (minuto)
+# derivam da mesma leitura e ficam estáveis entre reruns próximos, como chaves de cache
+agora = pd.Timestamp.now()
+hoje_dt = agora.normalize()
+
 # Sidebar para configuração de dados e metas
 st.sidebar.header("Configurações")
 usar_dados_exemplo = st.sidebar.checkbox("Usar dados de exemplo", value=True)
 
 # Carrega ou gera os dados
 if usar_dados_exemplo:
-    df = gerar_dados()
+    seed = st.sidebar.number_input("Semente dos dados de exemplo", min_value=0, value=0, step=1)
+    df = carregar_dados_exemplo(hoje_dt.date(), int(seed))
 else:
     uploaded_file = st.sidebar.file_uploader("Carregue a planilha (CSV ou Excel)", type=["csv", "xlsx"])
     if uploaded_file:
         try:
-            if uploaded_file.name.endswith("csv"):
-                df = pd.read_csv(uploaded_file, parse_dates=["Data"])
-            else:
-                df = pd.read_excel(uploaded_file, parse_dates=["Data"])
+            df = carregar_planilha(uploaded_file.getvalue(), uploaded_file.name)
         except Exception as e:
             st.error(f"Erro ao carregar os dados: {e}")
             st.stop()
@@ -35,95 +83,161 @@ else:
         st.info("Carregue uma planilha para prosseguir.")
         st.stop()
 
-df["Data"] = pd.to_datetime(df["Data"], errors="coerce")
+# Os carregadores já entregam Data em datetime64[ns]; só converte se vier em outro tipo
+if df["Data"].dtype != "datetime64[ns]":
+    df["Data"] = pd.to_datetime(df["Data"], errors="coerce").astype("datetime64[ns]")
 
 # Define cutoff para separar realizado e previsto (apenas viagens futuras podem ser canceladas)
-hoje_dt = pd.Timestamp(datetime.now().date())
 # Aqui, cutoff = hoje (você pode ajustar se preferir 48h a partir de agora)
 cutoff = hoje_dt
-df = definir_valores(df, cutoff)
 
 # Seleção de rotas para cancelamento (apenas se aplicável aos dados futuros)
-rotas_disponiveis = sorted(df["Rota"].unique())
+# Os dois carregadores entregam Rota categórica: as rotas são as categorias, sem varrer as viagens
+rotas_disponiveis = df["Rota"].cat.categories.sort_values()
 rotas_canceladas = st.sidebar.multiselect("Selecione rotas a cancelar", rotas_disponiveis)
 
 # Define o período de check para viagens futuras (48 a 72 horas a partir de hoje)
-data_atual = pd.Timestamp.now()
+# Truncado ao minuto para que reruns próximos reaproveitem o cache dos gráficos
+data_atual = agora.floor("min")
 check_start = data_atual + pd.Timedelta(hours=48)
 check_end = data_atual + pd.Timedelta(hours=72)
 
-# Divide o dataframe em passado (realizado) e futuro (previsto)
-df_past = df[df["Data"] < cutoff].copy()
-df_future = df[df["Data"] >= cutoff].copy()
+COLUNAS_VALOR = ["GMV_valor", "Cash_valor", "GMV_baseline", "Cash_baseline"]
 
-# Na parte futura, para a simulação, remove as rotas canceladas
-if rotas_canceladas:
-    df_future_sim = df_future[~df_future["Rota"].isin(rotas_canceladas)].copy()
-else:
-    df_future_sim = df_future.copy()
-
-# Agrega os dados diários (não acumulados) do conjunto completo e do cenário simulado
-def agrupar_por_data(df_in):
-    agg = df_in.groupby("Data", as_index=False).agg({
-        "GMV_valor": "sum",
-        "Cash_valor": "sum",
-        "GMV_baseline": "sum",
-        "Cash_baseline": "sum"
-    }).sort_values("Data")
-    return agg
-
-df_agg_total = df.groupby("Data", as_index=False).agg({
-    "GMV_valor": "sum",
-    "Cash_valor": "sum",
-    "GMV_baseline": "sum",
-    "Cash_baseline": "sum"
-}).sort_values("Data")
-df_agg_future_sim = agrupar_por_data(df_future_sim)
-
-# Converte os dados agregados em acumulado (para os valores realizados/previstos)
-df_base_acum = transformar_em_acumulado(df_agg_total, "GMV_valor", "Cash_valor")
-df_sim_acum = pd.concat([
-    df_agg_total[df_agg_total["Data"] < cutoff],
-    df_agg_future_sim
-]).sort_values("Data")
-df_sim_acum = transformar_em_acumulado(df_sim_acum, "GMV_valor", "Cash_valor")
-
-# Calcula as diferenças acumuladas (apenas para datas futuras)
-df_diff = pd.merge(
-    df_base_acum[df_base_acum["Data"] >= cutoff][["Data", "GMV_acumulado", "Cash_acumulado"]],
-    df_sim_acum[df_sim_acum["Data"] >= cutoff][["Data", "GMV_acumulado", "Cash_acumulado"]].rename(
-        columns={"GMV_acumulado": "GMV_acumulado_sim", "Cash_acumulado": "Cash_acumulado_sim"}
-    ),
-    on="Data",
-    how="left"
-)
-df_diff["GMV_diferenca"] = df_diff["GMV_acumulado_sim"] - df_diff["GMV_acumulado"]
-df_diff["Cash_diferenca"] = df_diff["Cash_acumulado_sim"] - df_diff["Cash_acumulado"]
-
-# Calcula baseline histórico e meta histórica diluída acumulados (usando todos os dados)
-df_baseline_meta = df.groupby("Data", as_index=False).agg({
-    "GMV_baseline": "sum",
-    "Cash_baseline": "sum"
-}).sort_values("Data")
-df_baseline_meta = calcular_baseline_meta_acumulada(df_baseline_meta)
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_df})
+def calcular_base(df, cutoff):
+    """Agregados diários, acumulado base e baseline/meta: não dependem das rotas canceladas."""
+    # Realizado antes do cutoff, baseline depois (numa cópia: o df recebido é o dos carregadores)
+    df = definir_valores(df.copy(), cutoff)
+
+    # Pré-agregação por (Data, Rota), feita uma vez: cada cenário de cancelamento filtra
+    # esta tabela em vez das viagens brutas. A ordem das chaves não importa aqui; só a
+    # agregação diária, usada nos acumulados, precisa sair ordenada por Data.
+    # dropna=False: viagens sem Rota entram nos totais (como no groupby por Data);
+    # as de Data NaT ficam de fora depois, em somar_por_data
+    grupos_rota = df.groupby(["Data", "Rota"], sort=False, observed=True, dropna=False)
+    df_agg_rota = grupos_rota[COLUNAS_VALOR].sum()
+    df_agg_rota["Viagens"] = grupos_rota.size()
+    df_agg_rota = df_agg_rota.reset_index()
+
+    # Agrega os dados diários (não acumulados) do conjunto completo a partir da pré-agregação
+    agg_data = somar_por_data(df_agg_rota, COLUNAS_VALOR + ["Viagens"])
+    df_agg_total = agg_data[["Data"] + COLUNAS_VALOR]
+    viagens_por_data = agg_data["Viagens"].to_numpy()
+
+    # Converte os dados agregados em acumulado (para os valores realizados/previstos)
+    df_base_acum = transformar_em_acumulado(df_agg_total, "GMV_valor", "Cash_valor")
+
+    # Calcula baseline histórico e meta histórica diluída acumulados (usando todos os dados),
+    # a partir das mesmas somas diárias
+    df_baseline_meta = calcular_baseline_meta_acumulada(
+        df_agg_total[["Data", "GMV_baseline", "Cash_baseline"]]
+    )
+    return df_agg_total, viagens_por_data, df_agg_rota, df_base_acum, df_baseline_meta
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_df})
+def calcular_simulacao(df, cutoff, rotas_canceladas):
+    """Acumulado do cenário sem as rotas canceladas e sua diferença para o base."""
+    df_agg_total, viagens_por_data, df_agg_rota, df_base_acum, _ = calcular_base(df, cutoff)
+    # Escalar NumPy para comparar direto com os arrays datetime64[ns] das colunas "Data"
+    cutoff_np = np.datetime64(cutoff, "ns")
+
+    # Divide em passado (realizado) e futuro (previsto); só o futuro é afetado pelo cancelamento.
+    # O agregado está ordenado por Data, então o corte é uma posição (busca binária)
+    datas_total = df_agg_total["Data"].to_numpy()
+    i_corte = np.searchsorted(datas_total, cutoff_np)
+
+    # Cenário simulado: em vez de reagrupar todo o futuro, desconta do agregado apenas
+    # a contribuição das viagens futuras das rotas canceladas
+    if rotas_canceladas:
+        # Filtro pelas rotas sobre os códigos da categórica: uma tabela booleana por categoria,
+        # indexada pelos códigos (a posição extra no fim recebe o código -1 de valores ausentes;
+        # rotas fora das categorias são ignoradas)
+        rotas = df_agg_rota["Rota"].cat
+        codigos_cancelados = rotas.categories.get_indexer(list(rotas_canceladas))
+        cancelada = np.zeros(len(rotas.categories) + 1, dtype=bool)
+        cancelada[codigos_cancelados[codigos_cancelados >= 0]] = True
+        mask_cancel = (
+            (df_agg_rota["Data"].to_numpy() >= cutoff_np)
+            & cancelada[rotas.codes.to_numpy()]
+        )
+        cancelado = somar_por_data(df_agg_rota[mask_cancel], COLUNAS_VALOR + ["Viagens"])
+        # As datas canceladas são um subconjunto das futuras: a posição de cada uma sai
+        # de uma busca binária nas datas ordenadas
+        pos = np.searchsorted(datas_total, cancelado["Data"].to_numpy())
+        restantes = viagens_por_data.copy()
+        restantes[pos] -= cancelado["Viagens"].to_numpy()
+        # Desconto diário de cada coluna na grade de datas do base; o acumulado simulado
+        # é o acumulado base menos o acumulado do desconto, sem um segundo cumsum completo
+        colunas_sim = {}
+        descontos = {}
+        for col in COLUNAS_VALOR:
+            valores = df_agg_total[col].to_numpy()
+            desconto = np.zeros(len(valores), dtype=np.result_type(valores, cancelado[col].to_numpy()))
+            desconto[pos] = cancelado[col].to_numpy()
+            colunas_sim[col] = valores - desconto
+            descontos[col] = desconto
+        gmv_desc = np.cumsum(descontos["GMV_valor"])
+        cash_desc = np.cumsum(descontos["Cash_valor"])
+        # O passado fica intacto e as datas em que todas as viagens foram canceladas saem
+        # do cenário, como antes: um único recorte do agregado, sem concatenar partes
+        manter = restantes > 0
+        df_sim_acum = df_agg_total.assign(
+            **colunas_sim,
+            GMV_acumulado=df_base_acum["GMV_acumulado"].to_numpy() - gmv_desc,
+            Cash_acumulado=df_base_acum["Cash_acumulado"].to_numpy() - cash_desc
+        )[manter]
+        # A diferença para o base é o próprio desconto acumulado, com sinal trocado;
+        # datas sem viagens na simulação viram NaN, como no merge à esquerda
+        gmv_diff = -gmv_desc[i_corte:]
+        cash_diff = -cash_desc[i_corte:]
+        if not manter.all():
+            gmv_diff = np.where(manter[i_corte:], gmv_diff, np.nan)
+            cash_diff = np.where(manter[i_corte:], cash_diff, np.nan)
+    else:
+        # Sem cancelamento o cenário simulado é o próprio base
+        df_sim_acum = df_base_acum
+        gmv_diff = np.zeros(len(datas_total) - i_corte, dtype=df_base_acum["GMV_acumulado"].dtype)
+        cash_diff = np.zeros(len(datas_total) - i_corte, dtype=df_base_acum["Cash_acumulado"].dtype)
+
+    # Diferenças acumuladas (apenas para datas futuras), já na grade de datas do base
+    base_fut = df_base_acum.iloc[i_corte:][["Data", "GMV_acumulado", "Cash_acumulado"]]
+    df_diff = base_fut.assign(
+        GMV_acumulado_sim=base_fut["GMV_acumulado"].to_numpy() + gmv_diff,
+        Cash_acumulado_sim=base_fut["Cash_acumulado"].to_numpy() + cash_diff,
+        GMV_diferenca=gmv_diff,
+        Cash_diferenca=cash_diff
+    ).reset_index(drop=True)
+    return df_sim_acum, df_diff
+
+_, _, _, df_base_acum, df_baseline_meta = calcular_base(df, cutoff)
+# Tupla ordenada: a mesma seleção, em qualquer ordem de clique, reaproveita o cache
+df_sim_acum, df_diff = calcular_simulacao(df, cutoff, tuple(sorted(rotas_canceladas)))
 
 # Sidebar para definir metas
 st.sidebar.subheader("Metas Mensais")
 meta_mensal_gmv = st.sidebar.number_input("Meta Mensal GMV", min_value=1000, value=600000, step=10000)
 meta_mensal_cash = st.sidebar.number_input("Meta Mensal Cash-Repasse", min_value=1000, value=300000, step=10000)
 
-# Para este exemplo, as funções de cálculo de meta histórica diluída estão implementadas em simulation.py
-# Já que usamos dados de exemplo para o baseline, esse módulo calcula e retorna os acumulados
+# O baseline acumulado (e o peso de cada dia) vem do cache de calcular_base; mudar uma
+# meta só reescala a meta diluída e seu acumulado, sem refazer a agregação
+df_baseline_meta = aplicar_metas(df_baseline_meta, meta_mensal_gmv, meta_mensal_cash)
 
 # ---------------------------------------------------------------------
 # Plotagem dos gráficos – usando as funções definidas em plotting.py
 # ---------------------------------------------------------------------
-fig_gmv = plot_gmv_acumulado(df_base_acum, df_sim_acum, df_diff, df_baseline_meta, check_start, check_end, hoje_dt)
-fig_cash = plot_cash_acumulado(df_base_acum, df_sim_acum, df_diff, df_baseline_meta, check_start, check_end, hoje_dt)
+# O gráfico só é reconstruído quando algum dos insumos muda
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_df})
+def construir_grafico(df_base_acum, df_sim_acum, df_diff, df_baseline_meta, check_start, check_end, hoje_dt):
+    # GMV e Cash numa só figura com eixo x compartilhado: um único payload para o navegador
+    contexto = preparar_contexto(df_base_acum, df_sim_acum, df_diff, hoje_dt, check_start)
+    return plot_gmv_cash_combined(df_base_acum, df_sim_acum, df_diff, df_baseline_meta, check_start, check_end, hoje_dt, contexto=contexto)
+
+fig = construir_grafico(df_base_acum, df_sim_acum, df_diff, df_baseline_meta, check_start, check_end, hoje_dt)
 
 st.subheader("Gráficos Interativos")
-st.plotly_chart(fig_gmv, use_container_width=True)
-st.plotly_chart(fig_cash, use_container_width=True)
+# theme=None: a figura vai como montada, sem o tema do Streamlit reescrever o layout
+st.plotly_chart(fig, use_container_width=True, theme=None, config={"responsive": True})
 
 # -----------------------------------------------------------------------------
 # Comparação de Cenários (salvar e visualizar)
@@ -132,11 +246,21 @@ st.sidebar.subheader("Comparação de Cenários")
 if "cenarios" not in st.session_state:
     st.session_state.cenarios = []
 
+def _enxugar(df_in, colunas):
+    # Só os arrays de Data e das colunas exibidas (sem índice nem blocos do DataFrame);
+    # acumulados inteiros no menor tipo que os comporta (sem perda)
+    arrays = {"Data": df_in["Data"].to_numpy()}
+    for col in colunas:
+        valores = df_in[col].to_numpy()
+        arrays[col] = pd.to_numeric(valores, downcast="integer") if valores.dtype.kind == "i" else valores
+    return arrays
+
 if st.sidebar.button("Salvar Cenário Atual"):
+    # Guarda só as colunas exibidas na comparação, não os frames inteiros
     scenario = {
-        "rotas_canceladas": rotas_canceladas,
-        "df_sim": df_sim_acum.copy(),
-        "df_diff": df_diff.copy()
+        "rotas_canceladas": tuple(rotas_canceladas),
+        "df_sim": _enxugar(df_sim_acum, ["GMV_acumulado", "Cash_acumulado"]),
+        "df_diff": _enxugar(df_diff, ["GMV_diferenca", "Cash_diferenca"])
     }
     st.session_state.cenarios.append(scenario)
     st.sidebar.success("Cenário salvo com sucesso!")
@@ -148,9 +272,10 @@ if st.sidebar.button("Visualizar Comparação de Cenários"):
             st.write(f"**Cenário {i+1}:** Rotas Canceladas: " +
                      (", ".join(cen["rotas_canceladas"]) if cen["rotas_canceladas"] else "Nenhuma"))
             st.write("Simulação Acumulada:")
-            st.dataframe(cen["df_sim"][["Data", "GMV_acumulado", "Cash_acumulado"]])
+            # O DataFrame só é montado na exibição
+            st.dataframe(pd.DataFrame(cen["df_sim"], copy=False))
             st.write("Diferença Acumulada:")
-            st.dataframe(cen["df_diff"][["Data", "GMV_diferenca", "Cash_diferenca"]])
+            st.dataframe(pd.DataFrame(cen["df_diff"], copy=False))
     else:
         st.sidebar.info("Nenhum cenário salvo ainda.")
 